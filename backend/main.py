@@ -1,13 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 import logging
+import mimetypes
 import os
 from dotenv import load_dotenv
+import anyio
+import asyncio
 import io, sys
-# from PIL import Image
+import orjson
+
+# Load .env before importing the model modules: they resolve their settings at import time.
+load_dotenv()
 
 # Add the parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -15,19 +24,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import model_integration
 import model_integration_image
 
-
-from PIL import Image
-import io
-
-load_dotenv()
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Movie Question API",
     description="A FastAPI backend for movie questions and image generation",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -38,6 +42,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """GZip middleware that leaves images and event streams untouched.
+
+    Generated images are already compressed, and gzip buffering would hold back
+    streamed tokens until a full compression block is ready.
+    """
+
+    excluded_paths = ("/generate-image", "/ask-movie-question/stream")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=512, compresslevel=5)
+
+async def _refresh_schema_periodically():
+    """Keep the schema cache warm so requests never wait on introspection."""
+    while True:
+        await asyncio.sleep(model_integration.SCHEMA_REFRESH_SECONDS)
+        try:
+            await model_integration.refresh_schema_text()
+        except Exception as e:
+            logger.warning(f"Schema refresh failed: {str(e)}")
+
+@app.on_event("startup")
+async def warm_caches():
+    """Introspect the Neo4j schema and prime the LLM prompt prefixes before serving."""
+    # Worker threads run blocking work (image resizing) off the event loop.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 64
+    schema_text = await model_integration.refresh_schema_text()
+    logger.info(f"Cached Neo4j schema: {schema_text or 'unavailable'}")
+    app.state.schema_refresh_task = asyncio.create_task(_refresh_schema_periodically())
+    try:
+        await model_integration.warm_up_prompt_cache(schema_text)
+    except Exception as e:
+        logger.warning(f"Prompt cache warm-up failed: {str(e)}")
+
+@app.on_event("shutdown")
+async def close_connections():
+    schema_refresh_task = getattr(app.state, "schema_refresh_task", None)
+    if schema_refresh_task is not None:
+        schema_refresh_task.cancel()
+    await model_integration.close_llm_client()
+    await model_integration.close_neo4j_driver()
+
 class MovieQuestionRequest(BaseModel):
     question: str
 
@@ -69,7 +120,7 @@ async def ask_movie_question(request: MovieQuestionRequest):
     try:
         logger.info(f"Received movie question: {request.question}")
 
-        response = model_integration.generate_text(request.question)
+        response = await model_integration.generate_text(request.question)
 
         # mock_response = f"This is a mock response about your movie question: '{request.question}'. Replace this with actual Gemini API integration."
         
@@ -84,40 +135,78 @@ async def ask_movie_question(request: MovieQuestionRequest):
         logger.error(f"Error processing movie question: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/ask-movie-question/stream")
+async def ask_movie_question_stream(request: MovieQuestionRequest):
+    """
+    Stream the answer to a movie question as server-sent events
+
+    Each `data:` event carries a JSON-encoded text fragment; the stream ends with
+    an `event: done` event, or `event: error` if generation failed midway.
+    """
+    logger.info(f"Received streaming movie question: {request.question}")
+
+    async def event_stream():
+        try:
+            async for token in model_integration.stream_text(request.question):
+                yield f"data: {orjson.dumps(token).decode()}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming movie question: {str(e)}")
+            yield f"event: error\ndata: {orjson.dumps('Internal server error').decode()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+def _resize_image(image_data: bytes, mime_type: str, width: int, height: int):
+    """Resize image bytes to `width` x `height`, returning `(data, mime_type)`.
+
+    Images that already have the requested size are returned untouched; resized
+    images are re-encoded as PNG at the fastest compression level.
+    """
+    # Imported lazily: only resize requests need PIL, and it is slow to import.
+    # pillow-simd is a drop-in replacement with a much faster resampler.
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    if image.size == (width, height):
+        return image_data, mime_type
+    image = image.resize((width, height), Image.BILINEAR)
+    img_buffer = io.BytesIO()
+    image.save(img_buffer, format='PNG', compress_level=1)
+    return img_buffer.getvalue(), "image/png"
+
 @app.post("/generate-image")
-async def generate_image(request: ImageGenerationRequest):
+async def generate_image(
+    request: ImageGenerationRequest,
+    width: Optional[int] = Query(None, gt=0),
+    height: Optional[int] = Query(None, gt=0),
+):
     """
     Generate images based on text prompts
-    
-    TODO: Integrate with Gemini API for image generation
-    - Use google.generativeai library
-    - Configure with GEMINI_API_KEY from environment
-    - Use appropriate Gemini model for image generation
-    - Return actual generated image
+
+    The image bytes returned by Gemini are passed through unchanged; they are
+    only decoded and re-encoded (as PNG) when both `width` and `height` are given
+    and differ from the generated image's size.
     """
     try:
         logger.info(f"Received image generation request: {request.text}")
 
 
-        image_data = model_integration_image.generate_image(request.text)
+        image_data, mime_type = await model_integration_image.generate_image(request.text)
 
-        # logger.info(f"Generated image data: {image_data}")
+        if width and height:
+            image_data, mime_type = await run_in_threadpool(
+                _resize_image, image_data, mime_type, width, height
+            )
 
-        # Convert to PIL Image if needed
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Process the image if needed (resize, format conversion, etc.)
-        # image = image.resize((400, 300))  # Example processing
-        
-        # Convert back to bytes
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        
+        extension = mimetypes.guess_extension(mime_type) or ".png"
         return Response(
-            content=img_buffer.getvalue(),
-            media_type="image/png",
-            headers={"Content-Disposition": "inline; filename=generated_image.png"}
+            content=image_data,
+            media_type=mime_type,
+            headers={"Content-Disposition": f"inline; filename=generated_image{extension}"}
         )
     
     except Exception as e:
@@ -126,4 +215,13 @@ async def generate_image(request: ImageGenerationRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Multiple workers require an import string; each worker imports this module itself.
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1)),
+    )
\ No newline at end of file
@@ -1,16 +1,50 @@
 from dotenv import load_dotenv
-from openai import OpenAI
-from neo4j import GraphDatabase
+from openai import AsyncOpenAI
+from neo4j import AsyncDriver, AsyncGraphDatabase
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict, Any, Optional
+from typing import TypedDict, List, Dict, Any, AsyncIterator, Optional
+from cachetools import TTLCache
 from galileo import galileo_context
 from galileo.openai import openai as gal_openai
-import json
+import asyncio
+import contextlib
+import hashlib
+import httpx
+import orjson
 import os
 import re
+import sys
 
 load_dotenv()
 
+_REQUIRED_ENV = ("SAMBANOVA_API_KEY", "NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD")
+_missing_env = [name for name in _REQUIRED_ENV if not os.environ.get(name)]
+if _missing_env:
+    raise RuntimeError(f"{', '.join(_missing_env)} must be set in the environment.")
+
+SAMBANOVA_API_KEY = os.environ["SAMBANOVA_API_KEY"]
+NEO4J_URI = os.environ["NEO4J_URI"]
+NEO4J_USERNAME = os.environ["NEO4J_USERNAME"]
+NEO4J_PASSWORD = os.environ["NEO4J_PASSWORD"]
+# Naming the database explicitly skips the home-database routing lookup.
+NEO4J_DATABASE = os.environ.get("NEO4J_DATABASE") or "neo4j"
+MODEL_FAST = os.environ.get("MODEL_FAST", "Meta-Llama-3.3-70B-Instruct")
+MODEL = os.environ.get("MODEL", "Deepseek-V3.1")
+
+_THINK_RE = re.compile(r"<think>[\s\S]*?</think>", re.IGNORECASE)
+_THINK_BLOCK_RE = re.compile(r"<think>.*?</think>\s*", re.DOTALL)
+_HEADING_RE = re.compile(r"^\s*cypher\s+query\s*:\s*", re.IGNORECASE)
+_KW_RE = re.compile(r"^(MATCH|CALL|WITH|UNWIND|RETURN|CREATE|MERGE|OPTIONAL|USE)\b", re.IGNORECASE)
+
+SCHEMA_CACHE_TTL_SECONDS = 600
+# Refresh well inside the TTL so a live process never introspects on the request path.
+SCHEMA_REFRESH_SECONDS = SCHEMA_CACHE_TTL_SECONDS // 2
+_schema_cache: TTLCache = TTLCache(maxsize=1, ttl=SCHEMA_CACHE_TTL_SECONDS)
+
+ANSWER_CACHE_TTL_SECONDS = 24 * 60 * 60
+_answer_cache: TTLCache = TTLCache(maxsize=1024, ttl=ANSWER_CACHE_TTL_SECONDS)
+_cypher_cache: TTLCache = TTLCache(maxsize=1024, ttl=ANSWER_CACHE_TTL_SECONDS)
+
 
 class GraphState(TypedDict, total=False):
     """State that flows through the LangGraph.
@@ -30,9 +64,13 @@ class GraphState(TypedDict, total=False):
     answer: str
 
 
-def _create_client() -> OpenAI:
-    sn_client = gal_openai.OpenAI(base_url="https://api.sambanova.ai/v1/",
-        api_key=os.environ.get("SAMBANOVA_API_KEY"))
+def _create_client() -> AsyncOpenAI:
+    sn_client = gal_openai.AsyncOpenAI(base_url="https://api.sambanova.ai/v1/",
+        api_key=SAMBANOVA_API_KEY,
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        ))
 
     # model = "DeepSeek-R1-Distill-Llama-70B"
     # prompt = "Tell me a joke about artificial intelligence."
@@ -56,18 +94,39 @@ def _create_client() -> OpenAI:
     return sn_client
 
 
-def _get_neo4j_driver():
-    uri = os.environ.get("NEO4J_URI")
-    user = os.environ.get("NEO4J_USERNAME")
-    password = os.environ.get("NEO4J_PASSWORD")
-    if not uri or not user or not password:
-        raise RuntimeError(
-            "NEO4J_URI, NEO4J_USERNAME, and NEO4J_PASSWORD must be set in the environment."
-        )
-    return GraphDatabase.driver(uri, auth=(user, password))
+# Shared by every call so requests reuse pooled keep-alive connections.
+_SN_CLIENT = _create_client()
+
+
+async def close_llm_client() -> None:
+    """Close the shared SambaNova client's connection pool; call once at process shutdown."""
+    await _SN_CLIENT.close()
+
+
+_neo4j_driver: Optional[AsyncDriver] = None
+
 
+def _get_neo4j_driver() -> AsyncDriver:
+    """Return the process-wide Neo4j driver, creating it on first use."""
+    global _neo4j_driver
+    if _neo4j_driver is not None:
+        return _neo4j_driver
 
-def _introspect_schema_text() -> str:
+    _neo4j_driver = AsyncGraphDatabase.driver(
+        NEO4J_URI, auth=(NEO4J_USERNAME, NEO4J_PASSWORD), max_connection_pool_size=50
+    )
+    return _neo4j_driver
+
+
+async def close_neo4j_driver() -> None:
+    """Close the shared Neo4j driver; call once at process shutdown."""
+    global _neo4j_driver
+    if _neo4j_driver is not None:
+        await _neo4j_driver.close()
+        _neo4j_driver = None
+
+
+async def _introspect_schema_text() -> str:
     """Return a small textual summary of the Neo4j schema (best-effort)."""
     try:
         driver = _get_neo4j_driver()
@@ -75,9 +134,10 @@ def _introspect_schema_text() -> str:
         return ""
 
     try:
-        with driver.session() as session:
+        async with driver.session(database=NEO4J_DATABASE) as session:
             try:
-                record = session.run("CALL db.schema.visualization()").single()
+                result = await session.run("CALL db.schema.visualization()")
+                record = await result.single()
                 if record is None:
                     return ""
                 nodes = record.get("nodes", [])
@@ -90,14 +150,14 @@ def _introspect_schema_text() -> str:
                 )
             except Exception:
                 # Fallback when visualization proc isn't available.
-                node_rows = session.run("CALL db.labels()").data()
+                node_rows = await (await session.run("CALL db.labels()")).data()
                 rel_rows = []
                 try:
-                    rel_rows = session.run("CALL db.relationshipTypes()").data()
+                    rel_rows = await (await session.run("CALL db.relationshipTypes()")).data()
                 except Exception:
                     try:
                         # Neo4j 5 alternative
-                        rel_rows = session.run("SHOW RELATIONSHIP TYPES").data()
+                        rel_rows = await (await session.run("SHOW RELATIONSHIP TYPES")).data()
                     except Exception:
                         rel_rows = []
                 labels = sorted({row.get("label", "?") for row in node_rows})
@@ -113,11 +173,53 @@ def _introspect_schema_text() -> str:
                 return f"Node labels: {', '.join(labels)}"
     except Exception:
         return ""
-    finally:
-        try:
-            driver.close()
-        except Exception:
-            pass
+
+
+async def get_schema_text() -> str:
+    """Return the schema summary, introspecting Neo4j at most once per TTL window."""
+    try:
+        return _schema_cache["schema"]
+    except KeyError:
+        pass
+    schema_text = await _introspect_schema_text()
+    if schema_text:
+        # Don't cache failed introspection so the next request retries.
+        _schema_cache["schema"] = schema_text
+    return schema_text
+
+
+async def refresh_schema_text() -> str:
+    """Re-introspect Neo4j and replace the cached schema summary.
+
+    A failed introspection keeps the previously cached value.
+    """
+    schema_text = await _introspect_schema_text()
+    if schema_text:
+        _schema_cache["schema"] = schema_text
+        return schema_text
+    return _schema_cache.get("schema", "")
+
+
+def invalidate_schema_cache() -> None:
+    """Drop the cached schema summary so the next lookup re-introspects Neo4j."""
+    _schema_cache.clear()
+
+
+def _find_fenced_block(text: str) -> Optional[str]:
+    """Return the body of the first ```cypher fenced block, else of the first fenced block."""
+    first: Optional[str] = None
+    pos = text.find("```")
+    while pos != -1:
+        end = text.find("```", pos + 3)
+        if end == -1:
+            break
+        body = text[pos + 3:end].lstrip()
+        if body[:6].lower() == "cypher" and body[6:7].isspace():
+            return body[6:]
+        if first is None:
+            first = body
+        pos = text.find("```", end + 3)
+    return first
 
 
 def _extract_cypher_from_text(text: str) -> str:
@@ -129,64 +231,107 @@ def _extract_cypher_from_text(text: str) -> str:
     if not text:
         return ""
 
-    # Remove chain-of-thought/reasoning tags if present
-    cleaned = re.sub(r"<think>[\s\S]*?</think>", "", text, flags=re.IGNORECASE)
+    # Remove chain-of-thought/reasoning tags if present; only the tagged spans are cut
+    cleaned = _THINK_RE.sub("", text) if "<" in text else text
 
-    # Prefer an explicit cypher code fence
-    match = re.search(r"```\s*[Cc]ypher\s+([\s\S]*?)```", cleaned)
-    if not match:
-        # Fallback: any fenced block
-        match = re.search(r"```\s*([\s\S]*?)```", cleaned)
-    if match:
-        candidate = match.group(1).strip()
-    else:
+    candidate = _find_fenced_block(cleaned)
+    if candidate is None:
         # Remove bold markers and obvious headings
-        reduced = cleaned.replace("**", "")
-        reduced = re.sub(r"(?i)^\s*cypher\s+query\s*:\s*", "", reduced)
-        # Heuristic: find first line that looks like Cypher and take until blank line
-        lines = [ln.strip() for ln in reduced.splitlines()]
-        start_idx: Optional[int] = None
-        for idx, ln in enumerate(lines):
-            if re.match(r"^(MATCH|CALL|WITH|UNWIND|RETURN|CREATE|MERGE|OPTIONAL|USE)\b", ln, re.IGNORECASE):
-                start_idx = idx
-                break
-        if start_idx is not None:
-            # Collect contiguous non-empty lines after start
-            collected: List[str] = []
-            for ln in lines[start_idx:]:
+        reduced = _HEADING_RE.sub("", cleaned.replace("**", ""))
+        # Heuristic: take the first line that looks like Cypher, up to the next blank line
+        collected: List[str] = []
+        for ln in reduced.splitlines():
+            ln = ln.strip()
+            if collected:
                 if not ln:
                     break
                 collected.append(ln)
-            candidate = "\n".join(collected).strip()
-        else:
-            candidate = cleaned.strip()
+            elif _KW_RE.match(ln):
+                collected.append(ln)
+        candidate = "\n".join(collected) if collected else cleaned
 
     # Final cleanup: strip stray fences, quotes, and trailing markdown artifacts
-    candidate = candidate.strip().strip("`").strip()
-    candidate = re.sub(r"^`+|`+$", "", candidate)
-    candidate = re.sub(r"^[\"']+|[\"']+$", "", candidate)
-    return candidate
-
-
-def _generate_cypher_from_question(question: str, schema_text: str, model: Optional[str] = None) -> str:
-    client = _create_client()
-    selected_model = model or os.environ.get("MODEL_FAST", "Meta-Llama-3.3-70B-Instruct")
-    system_prompt = (
-        "You are an expert in Neo4j Cypher. "
-        "Use ONLY the node labels and relationship types explicitly listed in the provided schema. "
-        "Do not invent labels or relationship types. If a label is not listed, do not use it. "
-        "Return ONLY a single valid Cypher query. No commentary. No markdown fences."
-    )
-    user_prompt = (
-        f"Schema: {schema_text or 'Unknown'}\n\n"
-        f"Question: {question}"
+    return candidate.strip().strip("`").strip().strip("\"'")
+
+
+# Upper bound on rows fetched per query; the reply prompt has finite context.
+MAX_ROWS = 200
+
+# Prompts are ordered invariant-first (instructions, then schema, then the per-request
+# question/data) and kept byte-identical across requests so the provider can reuse the
+# prefilled prefix between calls. Don't interpolate anything request-specific into them.
+CYPHER_INSTRUCTIONS = (
+    "You are an expert in Neo4j Cypher. "
+    "Use ONLY the node labels and relationship types explicitly listed in the provided schema. "
+    "Do not invent labels or relationship types. If a label is not listed, do not use it. "
+    f"Unless the question asks for a single aggregate, end the query with LIMIT {MAX_ROWS} or lower. "
+    "Return ONLY a single valid Cypher query. No commentary. No markdown fences."
+)
+
+REPLY_INSTRUCTIONS = (
+    "You answer the user's question using ONLY the provided Neo4j query results. "
+    "If the results are empty, explain that you don't have hard data in the database and provide result to the best of your knowledge. "
+    "Don't say that you don't have enough data and cannot confirm anything, just answer to the best of your ability and comment that you could refine your answer given more data. "
+    "Be concise and precise. If there was an execution error, surface it succinctly and politely."
+)
+
+
+def _cypher_system_prompt(schema_text: str) -> str:
+    return f"{CYPHER_INSTRUCTIONS}\nSchema:\n{schema_text or 'Unknown'}"
+
+
+async def warm_up_prompt_cache(schema_text: str) -> None:
+    """Send one minimal request per prompt prefix so the provider caches them.
+
+    Intended to run once at startup; completions are capped at a single token.
+    """
+    await asyncio.gather(
+        _SN_CLIENT.chat.completions.create(
+            model=MODEL_FAST,
+            temperature=0,
+            max_tokens=1,
+            messages=[
+                {"role": "system", "content": _cypher_system_prompt(schema_text)},
+                {"role": "user", "content": "Return the number of nodes."},
+            ],
+        ),
+        _SN_CLIENT.chat.completions.create(
+            model=MODEL,
+            temperature=0.2,
+            max_tokens=1,
+            messages=[
+                {"role": "system", "content": REPLY_INSTRUCTIONS},
+                {"role": "user", "content": "Question: Hello\n\nData (JSON):\n[]"},
+            ],
+        ),
     )
-    completion = client.chat.completions.create(
+
+
+def _question_key(question: str, *extra: str) -> str:
+    """Cache key for a question, insensitive to case and surrounding whitespace."""
+    return hashlib.sha1("\0".join((question.strip().lower(),) + extra).encode("utf-8")).hexdigest()
+
+
+def _cypher_cache_key(question: str, schema_text: str, model: Optional[str] = None) -> str:
+    return _question_key(question, schema_text, model or MODEL_FAST)
+
+
+async def _generate_cypher_from_question(question: str, schema_text: str, model: Optional[str] = None) -> str:
+    """Generate Cypher for `question`, reusing a previously successful query if cached.
+
+    Only `_query_db_node` populates the cache, once the query has actually run.
+    """
+    selected_model = model or MODEL_FAST
+    cached = _cypher_cache.get(_cypher_cache_key(question, schema_text, selected_model))
+    if cached is not None:
+        return cached
+
+    completion = await _SN_CLIENT.chat.completions.create(
         model=selected_model,
         temperature=0,
         messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
+            {"role": "system", "content": _cypher_system_prompt(schema_text)},
+            {"role": "user", "content": question},
         ],
     )
     raw = (completion.choices[0].message.content or "").strip()
@@ -194,56 +339,57 @@ def _generate_cypher_from_question(question: str, schema_text: str, model: Optio
     return cypher
 
 
-def _run_cypher(cypher: str) -> List[Dict[str, Any]]:
+async def _run_cypher(cypher: str) -> List[Dict[str, Any]]:
     driver = _get_neo4j_driver()
-    with driver.session() as session:
-        result = session.run(cypher)
-        rows: List[Dict[str, Any]] = [record.data() for record in result]
-    driver.close()
+    # fetch_size makes each PULL request at most MAX_ROWS records (the driver default
+    # is 1000), so only records we keep cross the wire; the rest are discarded with the session.
+    async with driver.session(database=NEO4J_DATABASE, fetch_size=MAX_ROWS) as session:
+        result = await session.run(cypher)
+        records = await result.fetch(MAX_ROWS)
+        rows: List[Dict[str, Any]] = [record.data() for record in records]
     return rows
 
 
-def _query_db_node(state: GraphState) -> GraphState:
+async def _query_db_node(state: GraphState) -> GraphState:
     question = state.get("question", "").strip()
     if not question:
         raise ValueError("question is required in the state")
 
-    schema_text = _introspect_schema_text()
-    cypher = _generate_cypher_from_question(question=question, schema_text=schema_text)
+    schema_text = await get_schema_text()
+    cypher = await _generate_cypher_from_question(question=question, schema_text=schema_text)
 
     try:
-        rows = _run_cypher(cypher)
+        rows = await _run_cypher(cypher)
     except Exception as exc:
         rows = []
         rows.append({"error": str(exc)})
+    else:
+        # Cache only queries Neo4j accepted, so a broken one is regenerated on retry.
+        if cypher:
+            _cypher_cache[_cypher_cache_key(question, schema_text)] = cypher
 
     return {"schema": schema_text, "cypher": cypher, "rows": rows}
 
 
-def _reply_node(state: GraphState) -> GraphState:
-    client = _create_client()
-    selected_model = os.environ.get("MODEL", "Deepseek-V3.1")
-    question = state.get("question", "")
-    rows = state.get("rows", [])
-
-    assistant_instructions = (
-        "You answer the user's question using ONLY the provided Neo4j query results. "
-        "If the results are empty, explain that you don't have hard data in the database and provide result to the best of your knowledge. "
-        "Don't say that you don't have enough data and cannot confirm anything, just answer to the best of your ability and comment that you could refine your answer given more data. "
-        "Be concise and precise. If there was an execution error, surface it succinctly and politely."
-    )
+def _reply_messages(question: str, rows: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     user_content = (
         f"Question: {question}\n\n" +
-        f"Data (JSON):\n{json.dumps(rows, ensure_ascii=False, indent=2)}"
+        f"Data (JSON):\n{orjson.dumps(rows, default=str).decode()}"
     )
+    return [
+        {"role": "system", "content": REPLY_INSTRUCTIONS},
+        {"role": "user", "content": user_content},
+    ]
 
-    completion = client.chat.completions.create(
-        model=selected_model,
+
+async def _reply_node(state: GraphState) -> GraphState:
+    question = state.get("question", "")
+    rows = state.get("rows", [])
+
+    completion = await _SN_CLIENT.chat.completions.create(
+        model=MODEL,
         temperature=0.2,
-        messages=[
-            {"role": "system", "content": assistant_instructions},
-            {"role": "user", "content": user_content},
-        ],
+        messages=_reply_messages(question, rows),
     )
     answer = (completion.choices[0].message.content or "").strip()
     return {"answer": answer}
@@ -260,23 +406,162 @@ def set_up_agents():
     return graph.compile()
 
 
+# Compiled once at import time and shared by every request; don't rebuild per call.
 graph = set_up_agents()
-def generate_text(
+
+
+@contextlib.asynccontextmanager
+async def _galileo_session():
+    """`galileo_context()` for async callers.
+
+    Exiting the Galileo context flushes the trace with a blocking upload, so the
+    exit runs in a worker thread instead of on the event loop.
+    """
+    context = galileo_context()
+    context.__enter__()
+    exc_info = (None, None, None)
+    try:
+        yield
+    except BaseException:
+        exc_info = sys.exc_info()
+        raise
+    finally:
+        await asyncio.to_thread(context.__exit__, *exc_info)
+
+
+async def generate_text(
     input: str,
     session_id: Optional[str] = None,
     run_name: Optional[str] = None,
     metadata: Optional[Dict[str, Any]] = None,
 ) -> str:
-    with galileo_context():
-        result = graph.invoke({"question": input})
+    cache_key = _question_key(input)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    async with _galileo_session():
+        result = await graph.ainvoke({"question": input})
 
     answer = result.get("answer", "")
     # Remove <think>...</think> tags and any content inside, if present
-    answer = re.sub(r"<think>.*?</think>\s*", "", answer, flags=re.DOTALL)
+    answer = _THINK_BLOCK_RE.sub("", answer)
     # If the answer is wrapped in a dict, extract the 'answer' field
     result["answer"] = answer.strip()
 
+    # Answers built on a failed query are worth retrying, so only cache clean runs.
+    if result["answer"] and not any("error" in row for row in result.get("rows", [])):
+        _answer_cache[cache_key] = result["answer"]
+
     return result["answer"]
 
+class _ThinkFilter:
+    """Incrementally drop `<think>...</think>` blocks from streamed text.
+
+    Mirrors `_THINK_BLOCK_RE` for text that arrives in chunks: text from `<think>`
+    up to `</think>` is held back and discarded, as is the whitespace after it (and
+    at the start of the stream). A trailing fragment that may begin a tag is held
+    until the next chunk disambiguates it.
+    """
+
+    _OPEN = "<think>"
+    _CLOSE = "</think>"
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._in_think = False
+        self._skip_whitespace = True
+
+    def feed(self, chunk: str) -> str:
+        """Add `chunk` and return the text that is now safe to emit."""
+        self._buffer += chunk
+        out: List[str] = []
+        while self._buffer:
+            if self._in_think:
+                end = self._buffer.find(self._CLOSE)
+                if end == -1:
+                    # Keep just enough to recognise a closing tag split across chunks.
+                    self._buffer = self._buffer[-(len(self._CLOSE) - 1):]
+                    break
+                self._buffer = self._buffer[end + len(self._CLOSE):]
+                self._in_think = False
+                self._skip_whitespace = True
+                continue
+            if self._skip_whitespace:
+                self._buffer = self._buffer.lstrip()
+                if not self._buffer:
+                    break
+                self._skip_whitespace = False
+            start = self._buffer.find(self._OPEN)
+            if start != -1:
+                out.append(self._buffer[:start])
+                self._buffer = self._buffer[start + len(self._OPEN):]
+                self._in_think = True
+                continue
+            held = self._partial_open_length()
+            out.append(self._buffer[:len(self._buffer) - held])
+            self._buffer = self._buffer[len(self._buffer) - held:]
+            break
+        return "".join(out)
+
+    def flush(self) -> str:
+        """Return any text still held back once the stream has ended."""
+        remaining = "" if self._in_think else self._buffer
+        self._buffer = ""
+        return remaining
+
+    def _partial_open_length(self) -> int:
+        # Length of the longest suffix of the buffer that is a proper prefix of `<think>`.
+        for length in range(min(len(self._OPEN) - 1, len(self._buffer)), 0, -1):
+            if self._buffer.endswith(self._OPEN[:length]):
+                return length
+        return 0
+
+
+async def stream_text(input: str) -> AsyncIterator[str]:
+    """Yield the answer to `input` incrementally as the model generates it.
+
+    Runs the QueryDB step like `generate_text`, then streams the reply completion
+    instead of waiting for the whole answer. Reasoning (`<think>`) blocks are
+    filtered out as they stream. Cached answers are yielded in one piece.
+    """
+    cache_key = _question_key(input)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    tokens: List[str] = []
+    think_filter = _ThinkFilter()
+    async with _galileo_session():
+        state = await _query_db_node({"question": input})
+        rows = state.get("rows", [])
+        completion = await _SN_CLIENT.chat.completions.create(
+            model=MODEL,
+            temperature=0.2,
+            messages=_reply_messages(input, rows),
+            stream=True,
+        )
+        async for chunk in completion:
+            if chunk.choices and (token := chunk.choices[0].delta.content):
+                if (text := think_filter.feed(token)):
+                    tokens.append(text)
+                    yield text
+        if (text := think_filter.flush()):
+            tokens.append(text)
+            yield text
+
+    answer = "".join(tokens).strip()
+    if answer and not any("error" in row for row in rows):
+        _answer_cache[cache_key] = answer
+
+
 if __name__ == "__main__":
-    print(generate_text("Who were the actors in The Matrix?"))
\ No newline at end of file
+    async def _main() -> None:
+        try:
+            print(await generate_text("Who were the actors in The Matrix?"))
+        finally:
+            await close_llm_client()
+            await close_neo4j_driver()
+
+    asyncio.run(_main())
\ No newline at end of file
@@ -1,5 +1,6 @@
+import asyncio
 import os
-from typing import Optional
+from typing import Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -14,6 +15,18 @@ except Exception as exc:  # pragma: no cover - import-time failure surface early
     ) from exc
 
 
+# Prefer explicit API key; the client also reads `GOOGLE_API_KEY` from env if not provided.
+GENAI_API_KEY = (
+    os.environ.get("GOOGLE_API_KEY")
+    or os.environ.get("GOOGLE_GENAI_API_KEY")
+    or os.environ.get("GENAI_API_KEY")
+)
+
+IMAGE_MODEL = "gemini-2.0-flash-preview-image-generation"
+_IMAGE_CONFIG = types.GenerateContentConfig(
+    response_modalities=["IMAGE", "TEXT"],
+)
+
 _genai_client: Optional["genai.Client"] = None
 
 
@@ -22,29 +35,23 @@ def _get_genai_client() -> "genai.Client":
     if _genai_client is not None:
         return _genai_client
 
-    # Prefer explicit API key; the client also reads `GOOGLE_API_KEY` from env if not provided.
-    api_key = (
-        os.environ.get("GOOGLE_API_KEY")
-        or os.environ.get("GOOGLE_GENAI_API_KEY")
-        or os.environ.get("GENAI_API_KEY")
-    )
-
-    if api_key:
-        _genai_client = genai.Client(api_key=api_key)
+    if GENAI_API_KEY:
+        _genai_client = genai.Client(api_key=GENAI_API_KEY)
     else:
         _genai_client = genai.Client()
 
     return _genai_client
 
 
-def generate_image(input: str) -> bytes:
+async def generate_image(input: str) -> Tuple[bytes, str]:
     """Generate an image from a text prompt using Gemini and return raw bytes.
 
     Args:
         input: The text prompt describing the desired image.
 
     Returns:
-        Raw image bytes suitable to send to a frontend or save to disk.
+        A `(data, mime_type)` tuple: raw image bytes exactly as returned by
+        Gemini, suitable to send to a frontend or save to disk, and their MIME type.
 
     Raises:
         RuntimeError: If the API returns no image data.
@@ -56,12 +63,10 @@ def generate_image(input: str) -> bytes:
     client = _get_genai_client()
 
     # Use the Gemini image generation preview model.
-    response = client.models.generate_content(
-        model="gemini-2.0-flash-preview-image-generation",
+    response = await client.aio.models.generate_content(
+        model=IMAGE_MODEL,
         contents=input,
-        config=types.GenerateContentConfig(
-            response_modalities=["IMAGE", "TEXT"],
-        ),
+        config=_IMAGE_CONFIG,
     )
 
     # The response may contain multiple parts; return the first inline image data.
@@ -72,13 +77,13 @@ def generate_image(input: str) -> bytes:
         for part in getattr(content, "parts", []) or []:
             inline_data = getattr(part, "inline_data", None)
             if inline_data and getattr(inline_data, "data", None):
-                return inline_data.data
+                return inline_data.data, getattr(inline_data, "mime_type", None) or "image/png"
 
     raise RuntimeError("No image data returned from Gemini image generation.")
 
 
 if __name__ == "__main__":
-    resp = generate_image("Beautiful kitty")
+    resp, _ = asyncio.run(generate_image("Beautiful kitty"))
     
     from PIL import Image
     import io
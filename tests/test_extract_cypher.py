@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for _name in ("SAMBANOVA_API_KEY", "NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD"):
+    os.environ.setdefault(_name, "test")
+
+from model_integration import _extract_cypher_from_text  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("` MATCH (n)`", "MATCH (n)"),
+        ("  `MATCH (n) RETURN n`  ", "MATCH (n) RETURN n"),
+        ("`'MATCH (n)'`", "MATCH (n)"),
+        ("'`MATCH (n)`'", "`MATCH (n)`"),
+        ("' MATCH (n) '", " MATCH (n) "),
+    ],
+)
+def test_final_cleanup_strips_fences_quotes_and_whitespace(text, expected):
+    assert _extract_cypher_from_text(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("```cypher\nMATCH (n) RETURN n\n```", "MATCH (n) RETURN n"),
+        ("``` Cypher\nMATCH (n) RETURN n\n```", "MATCH (n) RETURN n"),
+        ("```\nMATCH (m:Movie) RETURN m.title LIMIT 5\n```", "MATCH (m:Movie) RETURN m.title LIMIT 5"),
+        ("```sql\nSELECT 1\n```\nthen\n```cypher\nMATCH (x) RETURN x\n```", "MATCH (x) RETURN x"),
+        ("```cypher\nMATCH (n) RETURN n", "MATCH (n) RETURN n"),
+        ("Cypher query: MATCH (n) RETURN count(n)", "MATCH (n) RETURN count(n)"),
+        ("**Cypher query:**\nHere:\nMATCH (a)-[:ACTED_IN]->(m)\nRETURN a\n\ntrailing", "MATCH (a)-[:ACTED_IN]->(m)\nRETURN a"),
+        ("<think>try ```x```</think>```cypher\nMATCH (n) RETURN n\n```", "MATCH (n) RETURN n"),
+        ("<THINK>a</THINK>MATCH (n) RETURN n", "MATCH (n) RETURN n"),
+        ("MATCH (n) <think>x</think> RETURN n", "MATCH (n)  RETURN n"),
+        ("<think>a</think>x<think>b</think>MATCH (n) RETURN n", "xMATCH (n) RETURN n"),
+        ("<think>unterminated\nMATCH (n) RETURN n", "MATCH (n) RETURN n"),
+        ("no cypher here", "no cypher here"),
+        ("", ""),
+    ],
+)
+def test_extracts_cypher_like_the_regex_implementation(text, expected):
+    assert _extract_cypher_from_text(text) == expected
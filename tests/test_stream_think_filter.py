@@ -0,0 +1,70 @@
+import asyncio
+import contextlib
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for _name in ("SAMBANOVA_API_KEY", "NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD"):
+    os.environ.setdefault(_name, "test")
+
+import model_integration  # noqa: E402
+
+
+def _feed_all(chunks):
+    think_filter = model_integration._ThinkFilter()
+    out = [think_filter.feed(chunk) for chunk in chunks]
+    out.append(think_filter.flush())
+    return "".join(out)
+
+
+def test_think_block_split_across_chunks_is_dropped():
+    chunks = ["<thi", "nk>sec", "ret</th", "ink>", "\n\n", "Hello", " wor", "ld"]
+    assert _feed_all(chunks) == "Hello world"
+
+
+def test_text_resembling_a_tag_prefix_is_emitted():
+    assert _feed_all(["a <", "b ", "<th", "e end"]) == "a <b <the end"
+
+
+def test_unterminated_think_block_is_withheld():
+    assert _feed_all(["Answer ", "<think>still thinking"]) == "Answer "
+
+
+class _FakeCompletions:
+    def __init__(self, tokens):
+        self._tokens = tokens
+
+    async def create(self, **kwargs):
+        async def stream():
+            for token in self._tokens:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+        return stream()
+
+
+def test_stream_matches_cached_answer(monkeypatch):
+    tokens = ["<think>sec", "ret</think>", " ", "Hello", " world"]
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=_FakeCompletions(tokens)))
+
+    async def fake_query_db_node(state):
+        return {"rows": [{"title": "The Matrix"}]}
+
+    @contextlib.asynccontextmanager
+    async def no_galileo_session():
+        yield
+
+    monkeypatch.setattr(model_integration, "_galileo_session", no_galileo_session)
+    monkeypatch.setattr(model_integration, "_SN_CLIENT", fake_client)
+    monkeypatch.setattr(model_integration, "_query_db_node", fake_query_db_node)
+    model_integration._answer_cache.clear()
+
+    async def collect():
+        return [token async for token in model_integration.stream_text("Who?")]
+
+    streamed = asyncio.run(collect())
+    cached = asyncio.run(collect())
+
+    assert "".join(streamed) == "Hello world"
+    assert cached == ["Hello world"]